@@ -126,6 +126,67 @@ def pack_font(src: pathlib.Path, dst: pathlib.Path):
             shutil.copyfile(src, dst)
 
 
+def pack_one(
+    source: "str | pathlib.Path", packed: "str | pathlib.Path", logger: typing.Callable
+):
+    source = pathlib.Path(source)
+    packed = pathlib.Path(packed)
+    logger(f"Pack: custom user pack '{source.name}'")
+    if packed.exists():
+        try:
+            if packed.is_dir():
+                shutil.rmtree(packed, ignore_errors=True)
+            else:
+                packed.unlink()
+        except Exception:
+            pass
+
+    if (source / "Anims/manifest.txt").exists():
+        (packed / "Anims").mkdir(parents=True, exist_ok=True)
+        copy_file_as_lf(source / "Anims/manifest.txt", packed / "Anims/manifest.txt")
+        manifest = (source / "Anims/manifest.txt").read_bytes()
+        for anim in re.finditer(rb"Name: (.*)", manifest):
+            anim = (
+                anim.group(1)
+                .decode()
+                .replace("\\", "/")
+                .replace("/", os.sep)
+                .replace("\r", "\n")
+                .strip()
+            )
+            logger(f"Compile: anim for pack '{source.name}': {anim}")
+            pack_anim(source / "Anims" / anim, packed / "Anims" / anim)
+
+    if (source / "Icons").is_dir():
+        for icons in (source / "Icons").iterdir():
+            if not icons.is_dir() or icons.name.startswith("."):
+                continue
+            for icon in icons.iterdir():
+                if icon.name.startswith("."):
+                    continue
+                if icon.is_dir():
+                    logger(
+                        f"Compile: icon for pack '{source.name}': {icons.name}/{icon.name}"
+                    )
+                    pack_icon_animated(icon, packed / "Icons" / icons.name / icon.name)
+                elif icon.is_file() and icon.suffix in (".png", ".bmx"):
+                    logger(
+                        f"Compile: icon for pack '{source.name}': {icons.name}/{icon.name}"
+                    )
+                    pack_icon_static(icon, packed / "Icons" / icons.name / icon.name)
+
+    if (source / "Fonts").is_dir():
+        for font in (source / "Fonts").iterdir():
+            if (
+                not font.is_file()
+                or font.name.startswith(".")
+                or font.suffix not in (".c", ".u8f")
+            ):
+                continue
+            logger(f"Compile: font for pack '{source.name}': {font.name}")
+            pack_font(font, packed / "Fonts" / font.name)
+
+
 def pack(
     input: "str | pathlib.Path", output: "str | pathlib.Path", logger: typing.Callable
 ):
@@ -137,67 +198,7 @@ def pack(
         if not source.is_dir() or source.name.startswith("."):
             continue
 
-        logger(f"Pack: custom user pack '{source.name}'")
-        packed = output / source.name
-        if packed.exists():
-            try:
-                if packed.is_dir():
-                    shutil.rmtree(packed, ignore_errors=True)
-                else:
-                    packed.unlink()
-            except Exception:
-                pass
-
-        if (source / "Anims/manifest.txt").exists():
-            (packed / "Anims").mkdir(parents=True, exist_ok=True)
-            copy_file_as_lf(
-                source / "Anims/manifest.txt", packed / "Anims/manifest.txt"
-            )
-            manifest = (source / "Anims/manifest.txt").read_bytes()
-            for anim in re.finditer(rb"Name: (.*)", manifest):
-                anim = (
-                    anim.group(1)
-                    .decode()
-                    .replace("\\", "/")
-                    .replace("/", os.sep)
-                    .replace("\r", "\n")
-                    .strip()
-                )
-                logger(f"Compile: anim for pack '{source.name}': {anim}")
-                pack_anim(source / "Anims" / anim, packed / "Anims" / anim)
-
-        if (source / "Icons").is_dir():
-            for icons in (source / "Icons").iterdir():
-                if not icons.is_dir() or icons.name.startswith("."):
-                    continue
-                for icon in icons.iterdir():
-                    if icon.name.startswith("."):
-                        continue
-                    if icon.is_dir():
-                        logger(
-                            f"Compile: icon for pack '{source.name}': {icons.name}/{icon.name}"
-                        )
-                        pack_icon_animated(
-                            icon, packed / "Icons" / icons.name / icon.name
-                        )
-                    elif icon.is_file() and icon.suffix in (".png", ".bmx"):
-                        logger(
-                            f"Compile: icon for pack '{source.name}': {icons.name}/{icon.name}"
-                        )
-                        pack_icon_static(
-                            icon, packed / "Icons" / icons.name / icon.name
-                        )
-
-        if (source / "Fonts").is_dir():
-            for font in (source / "Fonts").iterdir():
-                if (
-                    not font.is_file()
-                    or font.name.startswith(".")
-                    or font.suffix not in (".c", ".u8f")
-                ):
-                    continue
-                logger(f"Compile: font for pack '{source.name}': {font.name}")
-                pack_font(font, packed / "Fonts" / font.name)
+        pack_one(source, output / source.name, logger)
 
 
 if __name__ == "__main__":
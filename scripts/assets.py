@@ -148,6 +148,13 @@ class Main(App):
         )
         self.parser_packs.set_defaults(func=self.packs)
 
+        self.parser_pack = self.subparsers.add_parser(
+            "pack", help="Assemble single asset pack"
+        )
+        self.parser_pack.add_argument("input_directory", help="Pack source directory")
+        self.parser_pack.add_argument("output_directory", help="Pack output directory")
+        self.parser_pack.set_defaults(func=self.pack)
+
     def _icon2header(self, file):
         image = file2image(file)
         if image.width > MAX_IMAGE_WIDTH or image.height > MAX_IMAGE_HEIGHT:
@@ -390,6 +397,17 @@ class Main(App):
 
         return 0
 
+    def pack(self):
+        import asset_packer
+
+        asset_packer.pack_one(
+            self.args.input_directory,
+            self.args.output_directory,
+            self.logger.info,
+        )
+
+        return 0
+
 
 if __name__ == "__main__":
     Main()()
@@ -0,0 +1,70 @@
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Kept free of SCons imports and fully annotated, so it can be compiled
+# in place with mypyc; a built extension module shadows this file.
+
+# Pack files that produce a target, as paths relative to pack root. Each named
+# group spans the suffix that gets replaced, manifest is kept as is.
+_TARGET_RE = re.compile(
+    r"""
+    Anims/manifest\.txt
+    | Anims/(?:[^/]+/)+[^/]*?(?P<anim_frame>\.bm|\.png)
+    | Icons/[^/]+/[^/]+/(?:(?P<icon_meta>meta|frame_rate)|[^/]*?(?P<icon_frame>\.bm|\.png))
+    | Icons/[^/]+/[^/]*?(?P<icon_static>\.bmx|\.png)
+    | Fonts/[^/]*?(?P<font>\.u8f|\.c)
+    """,
+    re.VERBOSE,
+)
+_TARGET_SUFFIXES: Dict[str, str] = {
+    "anim_frame": ".bm",
+    "icon_meta": "meta",
+    "icon_frame": ".bm",
+    "icon_static": ".bmx",
+    "font": ".u8f",
+}
+
+# Only descend into known asset subtrees, keyed by depth from pack root
+_PRUNE_AT: Dict[int, Set[str]] = {0: {"Anims", "Icons", "Fonts"}}
+
+
+def walk(
+    root: str,
+    rel_dir: str = "",
+    depth: int = 0,
+    links: Optional[List[str]] = None,
+) -> Iterator[Tuple["os.DirEntry[str]", str]]:
+    # Single pass over the tree, DirEntry caches is_dir()/is_file() results.
+    # Yields entries with their posix path relative to walk root.
+    # Symlinks are skipped, their relative paths go to links if given.
+    keep_dirs: Optional[Set[str]] = _PRUNE_AT.get(depth)
+    with os.scandir(root) as entries:
+        for entry in entries:
+            name: str = entry.name
+            if name.startswith("."):
+                continue
+            if entry.is_symlink():
+                if links is not None:
+                    links.append(rel_dir + name)
+                continue
+            if entry.is_dir():
+                if name == "node_modules":
+                    continue
+                if keep_dirs is None or name in keep_dirs:
+                    yield from walk(entry.path, f"{rel_dir}{name}/", depth + 1, links)
+            elif depth > 0 and entry.is_file():
+                yield entry, rel_dir + name
+
+
+def pack_targets(root: str) -> Dict[str, None]:
+    # Packed output paths relative to pack root, in walk order, without dupes
+    out: Dict[str, None] = {}
+    for _, rel_path in walk(root):
+        if not (match := _TARGET_RE.fullmatch(rel_path)):
+            continue
+        kind: Optional[str] = match.lastgroup
+        if kind:
+            rel_path = rel_path[: match.start(kind)] + _TARGET_SUFFIXES[kind]
+        out[rel_path] = None
+    return out
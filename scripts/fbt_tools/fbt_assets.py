@@ -1,20 +1,56 @@
+import hashlib
+import importlib.util
+import json
+import logging
 import os
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
 
 from ansi.color import fg
+from fbt.packs import pack_targets, walk
 from SCons.Action import Action
 from SCons.Builder import Builder
+from SCons.Defaults import DirScanner
 from SCons.Errors import StopError
 from SCons.Node.FS import File
 
+try:
+    from blake3 import blake3 as _pack_hash
+except ImportError:
+    # Same digest length as blake3, so cache dirs look alike either way
+    def _pack_hash(data=b""):
+        return hashlib.blake2b(data, digest_size=32)
+
+
+# Glob results are reused by emitters between generate() calls. SCons keeps
+# a single copy of this module per process, so the cache is shared by all
+# envs and FAPs, and is cleared whenever the tool is applied to a new env.
+# Nodes declared in an icon dir after its first glob are not picked up.
+_glob_cache = {}
+
+
+def _cached_glob(env, pattern, dir_node):
+    dir_node = env.Dir(dir_node)
+    key = (pattern, dir_node.abspath)
+    if (nodes := _glob_cache.get(key)) is None:
+        nodes = _glob_cache[key] = tuple(env.GlobRecursive(pattern, dir_node))
+    return nodes
+
 
 def _icons_emitter(target, source, env):
-    icons_src = env.GlobRecursive("*.png", env["ICON_SRC_DIR"])
-    icons_src += env.GlobRecursive("**/frame_rate", env["ICON_SRC_DIR"])
+    icons_src = list(_cached_glob(env, "*.png", env["ICON_SRC_DIR"]))
+    icons_src += _cached_glob(env, "**/frame_rate", env["ICON_SRC_DIR"])
 
+    # Bundle name is a plain string unless caller passed a construction var
+    icon_file_name = env["ICON_FILE_NAME"]
+    if "$" in icon_file_name:
+        icon_file_name = env.subst(icon_file_name)
     target = [
-        target[0].File(env.subst("${ICON_FILE_NAME}.c")),
-        target[0].File(env.subst("${ICON_FILE_NAME}.h")),
+        target[0].File(f"{icon_file_name}.c"),
+        target[0].File(f"{icon_file_name}.h"),
     ]
     return target, icons_src
 
@@ -30,12 +66,12 @@ def _proto_emitter(target, source, env):
 
 def _dolphin_emitter(target, source, env):
     res_root_dir = source[0].Dir(env["DOLPHIN_RES_TYPE"])
-    source = list()
-    source.extend(env.GlobRecursive("*.*", res_root_dir.srcnode()))
+    # Depend on directory node, SCons scans its contents when checking
+    # for changes instead of globbing the whole tree here. Actions also
+    # take resources dir from it.
+    source = [res_root_dir.srcnode()]
 
     target_base_dir = target[0]
-    env.Replace(_DOLPHIN_OUT_DIR=target[0])
-    env.Replace(_DOLPHIN_SRC_DIR=res_root_dir)
 
     if env["DOLPHIN_RES_TYPE"] == "external":
         target = [target_base_dir.File("manifest.txt")]
@@ -67,79 +103,265 @@ def _dolphin_emitter(target, source, env):
     return target, source
 
 
-def _packs_emitter(target, source, env):
-    source_dir = source[0]
-    target_dir = target[0]
-    env.Replace(_PACKS_OUT_DIR=target_dir)
-    env.Replace(_PACKS_SRC_DIR=source_dir)
-    target = set()
-
-    # Animations
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Anims/manifest.txt", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Anims/**/*.bm", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node).removesuffix(".png") + ".bm"
-        for node in env.GlobRecursive("*/Anims/**/*.png", source_dir.srcnode())
-    )
-    # Animated icons
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Icons/*/*/meta", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node).removesuffix("frame_rate") + "meta"
-        for node in env.GlobRecursive("*/Icons/*/*/frame_rate", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Icons/*/*/*.bm", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node).removesuffix(".png") + ".bm"
-        for node in env.GlobRecursive("*/Icons/*/*/*.png", source_dir.srcnode())
-    )
-    # Static icons
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Icons/*/*.bmx", source_dir.srcnode())
-    )
-    target.update(
-        source_dir.rel_path(node).removesuffix(".png") + ".bmx"
-        for node in env.GlobRecursive("*/Icons/*/*.png", source_dir.srcnode())
+# Assets compiler modules, imported once per path instead of a new
+# interpreter for every asset target
+_assets_compilers = {}
+# Compiler runs are pure Python and hold the GIL anyway, so SCons job threads
+# take turns. That also keeps the root logger setup below race-free.
+_assets_compiler_lock = threading.Lock()
+
+
+def _run_assets_compiler(env, args):
+    compiler_path = env.subst("${ASSETS_COMPILER}")
+    with _assets_compiler_lock:
+        if (compiler := _assets_compilers.get(compiler_path)) is None:
+            # Compiler imports its siblings, same as when run as a script
+            if (compiler_dir := os.path.dirname(compiler_path)) not in sys.path:
+                sys.path.insert(0, compiler_dir)
+            spec = importlib.util.spec_from_file_location("assets", compiler_path)
+            compiler = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(compiler)
+            _assets_compilers[compiler_path] = compiler
+
+        # App configures the root logger for itself, undo that afterwards
+        # so other tools in this process don't inherit it
+        root_logger = logging.getLogger()
+        saved_level = root_logger.level
+        saved_handlers = root_logger.handlers[:]
+        try:
+            # Fresh app for each call, parsed args are kept on the instance
+            return compiler.Main(no_exit=True)(args)
+        finally:
+            root_logger.handlers[:] = saved_handlers
+            root_logger.setLevel(saved_level)
+
+
+def _icons_action(target, source, env):
+    return _run_assets_compiler(
+        env,
+        [
+            "icons",
+            env.subst("${ICON_SRC_DIR}"),
+            target[0].dir.abspath,
+            "--filename",
+            env.subst("${ICON_FILE_NAME}"),
+            "--fw-bundle",
+            env.subst("${ICON_FW_BUNDLE}"),
+            "--add-include",
+            env.subst("${ICON_ADD_INCLUDE}"),
+        ],
     )
-    # Fonts
-    target.update(
-        source_dir.rel_path(node)
-        for node in env.GlobRecursive("*/Fonts/*.u8f", source_dir.srcnode())
+
+
+def _dolphin_sym_action(target, source, env):
+    return _run_assets_compiler(
+        env,
+        [
+            "dolphin",
+            "-s",
+            env.subst("dolphin_${DOLPHIN_RES_TYPE}"),
+            source[0].abspath,
+            target[0].dir.abspath,
+        ],
     )
-    target.update(
-        source_dir.rel_path(node).removesuffix(".c") + ".u8f"
-        for node in env.GlobRecursive("*/Fonts/*.c", source_dir.srcnode())
+
+
+def _dolphin_ext_action(target, source, env):
+    return _run_assets_compiler(
+        env,
+        [
+            "dolphin",
+            source[0].abspath,
+            target[0].dir.abspath,
+        ],
     )
 
-    target = [target_dir.File(path) for path in target]
-    return target, source
+
+def _pack_cache_key(env, pack_src_dir):
+    # Everything the packer reads, plus the packer itself
+    key = _pack_hash(b"AssetPacksBuilder")
+    compiler_path = env.subst("${ASSETS_COMPILER}")
+    for script in (
+        compiler_path,
+        os.path.join(os.path.dirname(compiler_path), "asset_packer.py"),
+    ):
+        key.update(f"{script}:{os.stat(script).st_mtime_ns};".encode())
+    links = []
+    files = sorted(walk(pack_src_dir, links=links), key=lambda item: item[1])
+    if links:
+        # Packer follows symlinks, walk doesn't. Don't guess what's behind them.
+        return None
+    for entry, rel_path in files:
+        key.update(rel_path.encode())
+        key.update(b"\0")
+        with open(entry.path, "rb") as file:
+            key.update(hashlib.file_digest(file, _pack_hash).digest())
+    return key.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _prune_pack_cache(cache_dir, max_entries):
+    # Keep most recently used entries only, every source edit adds a new one
+    try:
+        with os.scandir(cache_dir) as entries:
+            cached = [entry for entry in entries if not entry.name.startswith(".")]
+        cached.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+    except OSError:
+        # Best effort, parallel job is pruning too
+        return
+    for entry in cached[max_entries:]:
+        # Move out of the way first, a pack being restored from this entry
+        # in parallel falls back to running the packer
+        try:
+            doomed_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".")
+        except OSError:
+            return
+        try:
+            os.rename(entry.path, os.path.join(doomed_dir, entry.name))
+        except OSError:
+            pass
+        shutil.rmtree(doomed_dir, ignore_errors=True)
+
+
+def _compile_pack(env, pack_src_dir, pack_out_dir):
+    cache_dir = env.Dir(env["ASSET_PACKS_CACHE_DIR"]).abspath
+
+    if cache_key := _pack_cache_key(env, pack_src_dir):
+        cached_pack_dir = os.path.join(cache_dir, cache_key)
+        if os.path.isdir(cached_pack_dir):
+            shutil.rmtree(pack_out_dir, ignore_errors=True)
+            try:
+                shutil.copytree(
+                    cached_pack_dir, pack_out_dir, copy_function=_link_or_copy
+                )
+                os.utime(cached_pack_dir)
+                return 0
+            except (OSError, shutil.Error):
+                # Pruned by a parallel job meanwhile
+                shutil.rmtree(pack_out_dir, ignore_errors=True)
+
+    # Packing is CPU heavy, separate process lets SCons -j run packs in parallel
+    if result := subprocess.run(
+        [
+            env.subst("${PYTHON3}"),
+            env.subst("${ASSETS_COMPILER}"),
+            "pack",
+            pack_src_dir,
+            pack_out_dir,
+        ],
+        env=env["ENV"],
+    ).returncode:
+        return result
+
+    if not cache_key:
+        return 0
+
+    # Store complete copy under unique temporary name first, so that
+    # interrupted or parallel jobs never see a partially populated entry.
+    # Packs with identical contents share a key, the first rename wins.
+    os.makedirs(cache_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".")
+    try:
+        shutil.copytree(
+            pack_out_dir,
+            staging_dir,
+            copy_function=_link_or_copy,
+            dirs_exist_ok=True,
+        )
+        os.rename(staging_dir, cached_pack_dir)
+    except (OSError, shutil.Error):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    _prune_pack_cache(cache_dir, int(env["ASSET_PACKS_CACHE_SIZE"]))
+    return 0
+
+
+def _pack_action(target, source, env):
+    pack_src_dir = source[0].srcnode().abspath
+    pack_out_dir = env.Dir(env["PACK_OUT_DIR"]).abspath
+    if result := _compile_pack(env, pack_src_dir, pack_out_dir):
+        return result
+    # Stamp lists packed files, so its signature follows pack contents
+    with open(target[0].abspath, "wt") as file:
+        file.write("\n".join(sorted(pack_targets(pack_src_dir))))
+    return 0
 
 
 def __invoke_git(args, source_dir):
-    cmd = ["git"]
+    # Read-only queries, don't contend for index lock with parallel jobs
+    cmd = ["git", "-c", "core.fsmonitor=false", "--no-optional-locks"]
     cmd.extend(args)
-    return (
-        subprocess.check_output(cmd, cwd=source_dir, stderr=subprocess.STDOUT)
-        .strip()
-        .decode()
+    result = subprocess.run(cmd, cwd=source_dir, capture_output=True, check=False)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip().decode()
+
+
+def _git_state_key(src_dir):
+    # Changes whenever HEAD moves or tags are added/removed, without running git
+    git_dir = os.path.join(src_dir, ".git")
+    if os.path.isfile(git_dir):
+        # Submodules and worktrees point to the actual git dir
+        with open(git_dir, "rt") as file:
+            gitdir_ref = file.read().strip().removeprefix("gitdir:").strip()
+        git_dir = os.path.join(src_dir, gitdir_ref)
+    common_dir = git_dir
+    if os.path.isfile(commondir_file := os.path.join(git_dir, "commondir")):
+        with open(commondir_file, "rt") as file:
+            common_dir = os.path.join(git_dir, file.read().strip())
+
+    state = hashlib.blake2b(digest_size=16)
+    with open(os.path.join(git_dir, "HEAD"), "rb") as file:
+        head = file.read()
+    state.update(head)
+    if head.startswith(b"ref:"):
+        ref_file = os.path.join(common_dir, head[4:].strip().decode())
+        if os.path.isfile(ref_file):
+            with open(ref_file, "rb") as file:
+                state.update(file.read())
+    for name in ("refs", "refs/tags", "packed-refs"):
+        ref_path = os.path.join(common_dir, name)
+        if os.path.exists(ref_path):
+            state.update(f"{name}:{os.stat(ref_path).st_mtime_ns};".encode())
+    return state.hexdigest()
+
+
+def _write_proto_ver(target_file, git_major, git_minor):
+    version_file_data = (
+        b"#pragma once",
+        f"#define PROTOBUF_MAJOR_VERSION {git_major}".encode(),
+        f"#define PROTOBUF_MINOR_VERSION {git_minor}".encode(),
+        b"",
     )
+    with open(str(target_file), "wb") as file:
+        file.write(b"\n".join(version_file_data))
 
 
 def _proto_ver_generator(target, source, env):
     target_file = target[0]
     src_dir = source[0].dir.abspath
+    cache_file = f"{target_file.abspath}.cache.json"
+
+    try:
+        cache_key = _git_state_key(src_dir)
+    except OSError:
+        # Not a regular git checkout, always ask git
+        cache_key = None
+
+    if cache_key:
+        try:
+            with open(cache_file, "rt") as file:
+                git_major, git_minor = json.load(file)[cache_key]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        else:
+            _write_proto_ver(target_file, git_major, git_minor)
+            return
 
     def fetch(unshallow=False):
         git_args = ["fetch", "--tags"]
@@ -147,8 +369,10 @@ def _proto_ver_generator(target, source, env):
             git_args.append("--unshallow")
 
         try:
-            __invoke_git(git_args, source_dir=src_dir)
-        except (subprocess.CalledProcessError, EnvironmentError):
+            fetched = __invoke_git(git_args, source_dir=src_dir) is not None
+        except EnvironmentError:
+            fetched = False
+        if not fetched:
             # Not great, not terrible
             print(fg.boldred("Git: fetch failed"))
 
@@ -158,11 +382,14 @@ def _proto_ver_generator(target, source, env):
                 ["describe", "--tags", "--abbrev=0"],
                 source_dir=src_dir,
             )
-        except (subprocess.CalledProcessError, EnvironmentError):
+        except EnvironmentError:
             return None
 
-    fetch()
+    # Only go to network when local tags are not enough
     git_describe = describe()
+    if not git_describe:
+        fetch()
+        git_describe = describe()
     if not git_describe:
         fetch(unshallow=True)
         git_describe = describe()
@@ -171,14 +398,14 @@ def _proto_ver_generator(target, source, env):
         raise StopError("Failed to process git tags for protobuf versioning")
 
     git_major, git_minor = git_describe.split(".")
-    version_file_data = (
-        "#pragma once",
-        f"#define PROTOBUF_MAJOR_VERSION {git_major}",
-        f"#define PROTOBUF_MINOR_VERSION {git_minor}",
-        "",
-    )
-    with open(str(target_file), "wt") as file:
-        file.write("\n".join(version_file_data))
+    _write_proto_ver(target_file, git_major, git_minor)
+
+    if cache_key:
+        try:
+            with open(cache_file, "wt") as file:
+                json.dump({cache_key: [git_major, git_minor]}, file)
+        except OSError:
+            pass
 
 
 def CompileIcons(
@@ -190,10 +417,7 @@ def CompileIcons(
     fw_bundle=False,
     add_include=False,
 ):
-    try:
-        os.mkdir(str(source_dir))
-    except FileExistsError:
-        pass
+    os.makedirs(str(source_dir), exist_ok=True)
     return env.IconBuilder(
         target_dir,
         None,
@@ -204,12 +428,58 @@ def CompileIcons(
     )
 
 
+def _resources_env(env):
+    # Resource trees are large and mostly untouched between builds, so only
+    # hash files whose timestamp changed. An edit that preserves mtime will
+    # go unnoticed, use FORCE=1 for that.
+    resources_env = env.Clone()
+    resources_env.Decider("MD5-timestamp")
+    return resources_env
+
+
+def CompileAssetPacks(env, target_dir, source_dir):
+    target_dir = env.Dir(target_dir)
+    source_dir = env.Dir(source_dir)
+    packs_env = _resources_env(env)
+    # One target per pack, so SCons can build them in parallel and only
+    # rebuild packs that changed. Target is a stamp next to the output dir,
+    # since packer recreates that dir and its contents go to SD card as is.
+    # Packed files are not declared, that would make each of them depend on
+    # every source file of the pack.
+    stamps_dir = target_dir.dir.Dir(f".{target_dir.name}")
+    packs = []
+    with os.scandir(source_dir.srcnode().abspath) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            pack_out_dir = target_dir.Dir(entry.name)
+            pack = packs_env.AssetPacksBuilder(
+                stamps_dir.File(f"{entry.name}.stamp"),
+                source_dir.Dir(entry.name),
+                PACK_OUT_DIR=pack_out_dir,
+            )
+            # Whatever takes output dir as source waits for the pack
+            packs_env.Depends(pack_out_dir, pack)
+            packs.extend(pack)
+    return packs
+
+
+def DolphinExtBuilder(env, target, source, **kw):
+    return _resources_env(env)._DolphinExtBuilder(target, source, **kw)
+
+
 def generate(env):
+    _glob_cache.clear()
     env.SetDefault(
         ASSETS_COMPILER="${FBT_SCRIPT_DIR}/assets.py",
         NANOPB_COMPILER="${ROOT_DIR}/lib/nanopb/generator/nanopb_generator.py",
+        ASSET_PACKS_CACHE_DIR="${ROOT_DIR}/build/.asset_cache",
+        # Max number of compiled packs kept in cache
+        ASSET_PACKS_CACHE_SIZE=16,
     )
     env.AddMethod(CompileIcons)
+    env.AddMethod(CompileAssetPacks)
+    env.AddMethod(DolphinExtBuilder)
 
     if not env["VERBOSE"]:
         env.SetDefault(
@@ -224,22 +494,9 @@ def generate(env):
         BUILDERS={
             "IconBuilder": Builder(
                 action=Action(
-                    [
-                        [
-                            "${PYTHON3}",
-                            "${ASSETS_COMPILER}",
-                            "icons",
-                            "${ICON_SRC_DIR}",
-                            "${TARGET.dir}",
-                            "--filename",
-                            "${ICON_FILE_NAME}",
-                            "--fw-bundle",
-                            "${ICON_FW_BUNDLE}",
-                            "--add-include",
-                            "${ICON_ADD_INCLUDE}",
-                        ],
-                    ],
+                    _icons_action,
                     "${ICONSCOMSTR}",
+                    varlist=["ICON_FILE_NAME", "ICON_FW_BUNDLE", "ICON_ADD_INCLUDE"],
                 ),
                 emitter=_icons_emitter,
             ),
@@ -263,50 +520,28 @@ def generate(env):
             ),
             "DolphinSymBuilder": Builder(
                 action=Action(
-                    [
-                        [
-                            "${PYTHON3}",
-                            "${ASSETS_COMPILER}",
-                            "dolphin",
-                            "-s",
-                            "dolphin_${DOLPHIN_RES_TYPE}",
-                            "${_DOLPHIN_SRC_DIR}",
-                            "${_DOLPHIN_OUT_DIR}",
-                        ],
-                    ],
+                    _dolphin_sym_action,
                     "${DOLPHINCOMSTR}",
+                    varlist=["DOLPHIN_RES_TYPE"],
                 ),
                 emitter=_dolphin_emitter,
+                source_scanner=DirScanner,
             ),
-            "DolphinExtBuilder": Builder(
+            "_DolphinExtBuilder": Builder(
                 action=Action(
-                    [
-                        [
-                            "${PYTHON3}",
-                            "${ASSETS_COMPILER}",
-                            "dolphin",
-                            "${_DOLPHIN_SRC_DIR}",
-                            "${_DOLPHIN_OUT_DIR}",
-                        ],
-                    ],
+                    _dolphin_ext_action,
                     "${DOLPHINCOMSTR}",
+                    varlist=["DOLPHIN_RES_TYPE"],
                 ),
                 emitter=_dolphin_emitter,
+                source_scanner=DirScanner,
             ),
             "AssetPacksBuilder": Builder(
                 action=Action(
-                    [
-                        [
-                            "${PYTHON3}",
-                            "${ASSETS_COMPILER}",
-                            "packs",
-                            "${_PACKS_SRC_DIR}",
-                            "${_PACKS_OUT_DIR}",
-                        ],
-                    ],
+                    _pack_action,
                     "${PACKSCOMSTR}",
                 ),
-                emitter=_packs_emitter,
+                source_scanner=DirScanner,
             ),
             "ProtoVerBuilder": Builder(
                 action=Action(